@@ -1,13 +1,33 @@
 import argparse
+import asyncio
+import base64
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import hashlib
+import json
+import mmap
 import os
 from pathlib import Path
 import re
-from elevenlabs.client import ElevenLabs
+import shutil
+import tempfile
+import time
+import wave
+from elevenlabs.client import AsyncElevenLabs, ElevenLabs
+from elevenlabs.environment import ElevenLabsEnvironment
 from elevenlabs import Voice, VoiceSettings
 from dotenv import load_dotenv
+import httpx
+import numpy as np
 from pydub import AudioSegment
 import io
 
+try:
+    import av
+except ImportError:  # PyAV is optional; the pause path falls back to pydub/ffmpeg
+    av = None
+
 def load_api_key_and_url(args):
     """Load ElevenLabs API key and URL from .env file or command-line argument."""
     load_dotenv()
@@ -17,9 +37,50 @@ def load_api_key_and_url(args):
     api_url = os.getenv("LABSURL", "https://api.elevenlabs.io")
     return api_key, api_url
 
-def list_voices(client):
-    """List available ElevenLabs voices with their IDs."""
+# Patterns compiled once at import; slugify and filename generation run per segment in split mode
+_DASH_RUN_RE = re.compile(r'-+')
+_VOICE_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9\s]')
+_VOICE_ID_RE = re.compile(r'[A-Za-z0-9]{20}')
+
+# Minimal voice record used when serving voices from the disk cache
+CachedVoice = namedtuple("CachedVoice", ["name", "voice_id"])
+
+VOICES_CACHE_TTL = 24 * 60 * 60  # 24 hours, in seconds
+
+# Connection pool shared by every request in a run; keep-alives long enough
+# to span large split batches
+_HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300)
+
+# HTTP/2 multiplexing needs the optional h2 extra (httpx[http2]); degrade
+# to HTTP/1.1 when it is missing rather than refusing to start
+try:
+    import h2
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+def load_voices(client, api_key, refresh=False):
+    """Fetch available voices, caching them on disk to skip the network round-trip on repeat runs."""
+    # Key the cache file by API key so accounts don't see each other's voices
+    key_digest = hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+    cache_file = Path.home() / ".cache" / "elevenify" / f"voices-{key_digest}.json"
+    try:
+        if not refresh and cache_file.exists() and time.time() - cache_file.stat().st_mtime < VOICES_CACHE_TTL:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return [CachedVoice(**entry) for entry in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        pass  # Corrupt or unreadable cache; fall through to a fresh fetch
     voices = client.voices.get_all().voices
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump([{"name": v.name, "voice_id": v.voice_id} for v in voices], f)
+    except OSError:
+        pass  # Caching is best-effort
+    return voices
+
+def list_voices(voices):
+    """List available ElevenLabs voices with their IDs."""
     print("Available ElevenLabs voices:")
     for voice in voices:
         print(f" - {voice.name} (ID: {voice.voice_id})")
@@ -38,202 +99,474 @@ def check_credits(client):
     except Exception as e:
         print(f"Error fetching credits: {str(e)}")
 
+def iter_segments(lines, start_line, last_line):
+    """Yield (line_number, sample_number, text) for non-comment lines, numbering samples across the whole input but yielding only lines within the range."""
+    sample_number = 0
+    for line_number, raw_line in enumerate(lines, 1):
+        # Strip trailing comments and whitespace
+        line = raw_line.partition('#')[0].strip()
+        if not line:
+            continue
+        sample_number += 1
+        if line_number < start_line or line_number > last_line:
+            continue
+        yield line_number, sample_number, line
+
 def get_model_credit_cost(model):
     """Return the credit cost per character for the specified model."""
-    if model == "eleven_turbo_v2":
+    if "turbo" in model or "flash" in model:
         return 0.5
     return 1.0
 
-def estimate_convertible_lines(client, text, start_line, last_line, model):
+def estimate_convertible_lines(client, lines, start_line, last_line, model):
     """Estimate lines convertible with remaining credits and for the full file within the specified range."""
     try:
         subscription = client.user.get_subscription()
         credits_remaining = subscription.character_limit - subscription.character_count
         credit_cost = get_model_credit_cost(model)
         
-        lines = text.strip().split('\n')
-        line_count = 0
-        total_chars = 0
-        total_credits = 0
-        full_file_lines = 0
-        full_file_chars = 0
-        full_file_credits = 0
-        line_number = 0
-        
-        for line in lines:
-            line_number += 1
-            if line_number < start_line or line_number > last_line:
-                continue
-            # Strip trailing comments and whitespace
-            line = line.split('#', 1)[0].strip()
-            if not line:
-                continue
-            chars = len(line)
-            line_credits = chars * credit_cost
-            # Full file estimate
-            full_file_lines += 1
-            full_file_chars += chars
-            full_file_credits += line_credits
-            # Current credits estimate
-            if total_credits + line_credits <= credits_remaining:
-                line_count += 1
-                total_chars += chars
-                total_credits += line_credits
-        
+        # Vectorized: one char-count array, one cumulative sum, one binary
+        # search for the line where the remaining credits run out
+        char_counts = np.fromiter((len(line) for _line_number, _sample_number, line in iter_segments(lines, start_line, last_line)), dtype=np.int64)
+        line_credits = char_counts * credit_cost
+        cumulative = np.cumsum(line_credits)
+        convertible = int(np.searchsorted(cumulative, credits_remaining, side='right'))
+
         return {
             'credits_remaining': credits_remaining,
             'credit_cost': credit_cost,
-            'lines': line_count,
-            'characters': total_chars,
-            'credits_required': total_credits,
-            'full_file_lines': full_file_lines,
-            'full_file_characters': full_file_chars,
-            'full_file_credits': full_file_credits
+            'lines': convertible,
+            'characters': int(char_counts[:convertible].sum()),
+            'credits_required': float(cumulative[convertible - 1]) if convertible else 0,
+            'full_file_lines': int(char_counts.size),
+            'full_file_characters': int(char_counts.sum()),
+            'full_file_credits': float(cumulative[-1]) if char_counts.size else 0
         }
     except Exception as e:
         print(f"Error estimating credits: {str(e)}")
         return None
 
-def split_text(text, start_line, last_line):
+# Parallel preprocessing only pays off once the per-line Python work dwarfs
+# worker startup and pickling; below this size a single pass wins
+_PARALLEL_SPLIT_THRESHOLD = 50_000
+_SPLIT_CHUNK_SIZE = 4096
+
+def _scan_chunk(chunk):
+    """Strip one chunk of lines, returning chunk-local (line_offset, sample_offset, text) tuples and the chunk's non-comment line count."""
+    kept = []
+    samples = 0
+    for offset, raw_line in enumerate(chunk):
+        line = raw_line.partition('#')[0].strip()
+        if not line:
+            continue
+        samples += 1
+        kept.append((offset, samples, line))
+    return kept, samples
+
+def _split_text_parallel(lines, start_line, last_line):
+    """Chunked split_text walk across worker processes, renumbered by cumulative offsets."""
+    chunks = [lines[i:i + _SPLIT_CHUNK_SIZE] for i in range(0, len(lines), _SPLIT_CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(_scan_chunk, chunks))
+    segments = []
+    line_base = 0
+    sample_base = 0
+    for chunk, (kept, samples) in zip(chunks, results):
+        for offset, sample_offset, line in kept:
+            if start_line <= line_base + offset + 1 <= last_line:
+                segments.append((sample_base + sample_offset, line))
+        line_base += len(chunk)
+        sample_base += samples
+    return segments
+
+def split_text(lines, start_line, last_line):
     """Split text into segments with sequential sample numbers, skipping comment lines and stripping trailing comments within the specified range."""
-    lines = text.strip().split('\n')
+    lines = list(lines)  # the size decides whether chunked workers pay off
+    if len(lines) > _PARALLEL_SPLIT_THRESHOLD:
+        return _split_text_parallel(lines, start_line, last_line)
     segments = []
     sample_number = 0
-    line_number = 0
-    for line in lines:
-        line_number += 1
-        # Strip trailing comments
-        line = line.split('#', 1)[0].strip()
+    for line_number, raw_line in enumerate(lines, 1):
+        line = raw_line.partition('#')[0].strip()
         if not line:
             continue
         sample_number += 1
-        if line_number < start_line or line_number > last_line:
-            continue
-        segments.append((sample_number, line))
-    # If no segments, try sentence splitting on non-comment text
-    if not segments:
-        non_comment_text = '\n'.join(line.split('#', 1)[0].strip() for i, line in enumerate(lines, 1) if i >= start_line and i <= last_line and line.split('#', 1)[0].strip())
-        sentences = re.split(r'(?<=[.!?])\s+', non_comment_text.strip())
-        segments = [(sample_number + i + 1, s) for i, s in enumerate(sentences) if s.strip()]
+        if start_line <= line_number <= last_line:
+            segments.append((sample_number, line))
     return segments
 
+class _SlugTable(dict):
+    """str.translate table where allowed characters map to themselves and everything else to '-'."""
+    def __missing__(self, codepoint):
+        return 45  # ord('-')
+
+_SLUG_TABLE = _SlugTable({ord(c): ord(c) for c in 'abcdefghijklmnopqrstuvwxyz0123456789.-'})
+
 def slugify(text):
     """Normalize text to a URL-friendly slug."""
-    slug = re.sub(r'[^a-z0-9.-]', '-', text.lower())
-    slug = re.sub(r'-+', '-', slug)
+    slug = _DASH_RUN_RE.sub('-', text.lower().translate(_SLUG_TABLE))
     return slug.strip('-')
 
-def get_unique_filename(voice_name, khz_rate, bit_rate, extension, prefix=None, start_sample_number=None, end_sample_number=None):
-    """Generate unique filename with optional prefix and sample number range."""
-    voice_name = re.sub(r'[^a-zA-Z0-9\s]', '_', voice_name)
+# Per-run filename and format constants, resolved once instead of per segment
+FileContext = namedtuple("FileContext", ["voice_slug", "output_format", "khz_rate", "bit_rate", "extension", "prefix"])
+
+def make_file_context(voice_name, audio_type, rate, prefix=None):
+    """Resolve the filename/format constants that are fixed for a whole run."""
+    output_format, khz_rate, bit_rate, extension = get_output_format(audio_type, rate)
+    return FileContext(_VOICE_SANITIZE_RE.sub('_', voice_name), output_format, khz_rate, bit_rate, extension, prefix)
+
+def get_unique_filename(voice_name, khz_rate, bit_rate, extension, prefix=None, start_sample_number=None, end_sample_number=None, existing=None):
+    """Generate unique filename with optional prefix and sample number range, checking against a directory snapshot."""
+    ctx = FileContext(_VOICE_SANITIZE_RE.sub('_', voice_name), None, khz_rate, bit_rate, extension, prefix)
+    return unique_filename_from_context(ctx, start_sample_number, end_sample_number, existing)
+
+def unique_filename_from_context(ctx, start_sample_number=None, end_sample_number=None, existing=None):
+    """Generate a unique filename from precomputed run constants; only f-string composition and set lookups per call."""
+    if existing is None:
+        existing = {entry.name for entry in os.scandir('.')}
     max_attempts = 1000  # Prevent infinite loops
     for index in range(max_attempts):
         if start_sample_number is not None and end_sample_number is not None:
             # Non-split mode with range
-            base = f"{start_sample_number:05d}-{end_sample_number:05d}-{voice_name}-{khz_rate:.2f}-{bit_rate}"
+            base = f"{start_sample_number:05d}-{end_sample_number:05d}-{ctx.voice_slug}-{ctx.khz_rate:.2f}-{ctx.bit_rate}"
             if index > 0:
                 base += f"-{index:05d}"
         elif start_sample_number is not None:
             # Split mode
-            base = f"{start_sample_number:05d}-{voice_name}-{khz_rate:.2f}-{bit_rate}"
+            base = f"{start_sample_number:05d}-{ctx.voice_slug}-{ctx.khz_rate:.2f}-{ctx.bit_rate}"
             if index > 0:
                 base += f"-{index:05d}"
         else:
             # Direct text input
-            base = f"{voice_name}-{khz_rate:.2f}-{bit_rate}-{index:05d}"
-        if prefix:
-            base = f"{prefix}-{base}"
-        filename = f"{base}.{extension}"
+            base = f"{ctx.voice_slug}-{ctx.khz_rate:.2f}-{ctx.bit_rate}-{index:05d}"
+        if ctx.prefix:
+            base = f"{ctx.prefix}-{base}"
+        filename = f"{base}.{ctx.extension}"
         filename = slugify(filename)
-        if not os.path.exists(filename):
+        if filename not in existing:
+            existing.add(filename)
             return filename
     raise ValueError(f"Could not generate unique filename after {max_attempts} attempts")
 
-def process_text_to_audio(client, text, voice_id, voice_name, model, audio_type, rate, prefix=None, start_sample_number=None, end_sample_number=None, pause=None, lines=None):
+class _GenReader:
+    """Minimal file-like wrapper over a bytes iterator so shutil.copyfileobj can pull large batches from it."""
+    def __init__(self, gen):
+        self._gen = iter(gen)
+        self._buf = bytearray()
+
+    def read(self, size=-1):
+        buf = self._buf
+        if size is None or size < 0:
+            for chunk in self._gen:
+                buf.extend(chunk)
+            out = bytes(buf)
+            buf.clear()
+            return out
+        while len(buf) < size:
+            try:
+                buf.extend(next(self._gen))
+            except StopIteration:
+                break
+        out = bytes(buf[:size])
+        del buf[:size]
+        return out
+
+_AUDIO_CACHE_DIR = Path.home() / ".cache" / "elevenify" / "audio"
+
+def get_audio_cache_path(voice_id, model, output_format, text, extension):
+    """Return the local cache path for a (voice, model, format, text) combination."""
+    key = hashlib.blake2b(f"{voice_id}|{model}|{output_format}|{text}".encode(), digest_size=16).hexdigest()
+    return _AUDIO_CACHE_DIR / f"{key}.{extension}"
+
+def save_to_audio_cache(cache_path, source_file):
+    """Store a generated audio file in the cache; failures are non-fatal."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so concurrent runs never observe
+        # a half-written cache entry
+        with tempfile.NamedTemporaryFile(dir=cache_path.parent, delete=False) as tmp:
+            with open(source_file, 'rb') as src:
+                shutil.copyfileobj(src, tmp)
+        os.replace(tmp.name, cache_path)
+    except OSError:
+        pass  # Caching is best-effort
+
+def link_or_copy(source, destination):
+    """Materialize source at destination, hardlinking (zero-copy) when the filesystem allows."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def _concat_mp3_av(audio_buffers, pause, output_file, bit_rate):
+    """Decode mp3 buffers, join them with silence, and re-encode, all in-process via libav."""
+    arrays = []
+    sample_rate = 44100
+    sample_format = 's16'
+    layout = 'mono'
+    for data in audio_buffers:
+        with av.open(io.BytesIO(data)) as container:
+            stream = container.streams.audio[0]
+            sample_rate = stream.rate
+            layout = stream.layout.name
+            frames = []
+            for frame in container.decode(stream):
+                sample_format = frame.format.name
+                frames.append(frame.to_ndarray())
+        arrays.append(np.concatenate(frames, axis=1))
+    silence = np.zeros((arrays[0].shape[0], int(pause * sample_rate)), dtype=arrays[0].dtype)
+    parts = [arrays[0]]
+    for array in arrays[1:]:
+        parts.extend((silence, array))
+    combined = np.ascontiguousarray(np.concatenate(parts, axis=1))
+    with av.open(output_file, 'w') as output:
+        out_stream = output.add_stream('mp3', rate=sample_rate)
+        out_stream.bit_rate = bit_rate * 1000
+        out_frame = av.AudioFrame.from_ndarray(combined, format=sample_format, layout=layout)
+        out_frame.rate = sample_rate
+        output.mux(out_stream.encode(out_frame))
+        output.mux(out_stream.encode(None))  # Flush the encoder
+
+def process_text_to_audio(client, text, voice_id, voice_name, model, audio_type, rate, prefix=None, start_sample_number=None, end_sample_number=None, pause=None, lines=None, existing=None, use_cache=True, latency=0):
     """Convert text to audio using ElevenLabs API with custom filename, adding pauses between lines if specified."""
     try:
         output_format, khz_rate, bit_rate, extension = get_output_format(audio_type, rate)
-        output_file = get_unique_filename(voice_name, khz_rate, bit_rate, extension, prefix, start_sample_number, end_sample_number)
+        output_file = get_unique_filename(voice_name, khz_rate, bit_rate, extension, prefix, start_sample_number, end_sample_number, existing)
         
-        if pause is not None and lines and len(lines) > 1:
-            # Generate audio for each line and concatenate with silence
-            audio_segments = []
-            for line in lines:
+        if pause is not None and lines and len(lines) > 1 and audio_type == 'pcm':
+            # Raw PCM needs no decode/re-encode round-trip: join the byte
+            # buffers with a precomputed silence buffer and write one WAV.
+            sample_rate = bit_rate  # for pcm formats the rate field is the sample rate
+            def generate_line_pcm(line):
                 audio = client.generate(
                     text=line,
                     voice=voice_id,
                     model=model,
-                    output_format=output_format
+                    output_format=output_format,
+                    optimize_streaming_latency=latency
                 )
-                # Convert audio stream to AudioSegment
-                audio_data = b''.join(audio)
-                audio_segment = AudioSegment.from_file(io.BytesIO(audio_data), format='mp3')
-                audio_segments.append(audio_segment)
-            
-            # Combine segments with silence
-            combined_audio = audio_segments[0]
-            silence = AudioSegment.silent(duration=int(pause * 1000))  # Pause in milliseconds
-            for segment in audio_segments[1:]:
-                combined_audio += silence + segment
-            
-            # Export combined audio
-            combined_audio.export(output_file, format=extension, bitrate=f"{bit_rate}k")
-        else:
-            # Single API call for no pause or single line
-            audio = client.generate(
-                text=text,
-                voice=voice_id,
-                model=model,
-                output_format=output_format
-            )
-            with open(output_file, "wb") as f:
+                # Single-pass accumulation; b''.join would first build a
+                # list of chunks and then allocate the joined copy
+                buf = bytearray()
                 for chunk in audio:
-                    f.write(chunk)
+                    buf.extend(chunk)
+                return bytes(buf)
+            with ThreadPoolExecutor(max_workers=min(8, len(lines))) as executor:
+                pcm_chunks = list(executor.map(generate_line_pcm, lines))
+            # 16-bit mono silence: 2 bytes per sample
+            silence_pcm = b'\x00' * (int(pause * sample_rate) * 2)
+            with wave.open(output_file, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                wav.writeframes(silence_pcm.join(pcm_chunks))
+        elif pause is not None and lines and len(lines) > 1:
+            # Generate audio for each line in parallel; executor.map preserves
+            # input order so the concatenation below stays correct.
+            def generate_line(line):
+                audio = client.generate(
+                    text=line,
+                    voice=voice_id,
+                    model=model,
+                    output_format=output_format,
+                    optimize_streaming_latency=latency
+                )
+                buf = bytearray()
+                for chunk in audio:
+                    buf.extend(chunk)
+                return bytes(buf)
+            with ThreadPoolExecutor(max_workers=min(8, len(lines))) as executor:
+                audio_buffers = list(executor.map(generate_line, lines))
+
+            if av is not None and extension == 'mp3':
+                # In-process libav decode/encode; no ffmpeg subprocess per segment
+                _concat_mp3_av(audio_buffers, pause, output_file, bit_rate)
+            else:
+                audio_segments = [AudioSegment.from_file(io.BytesIO(data), format='mp3') for data in audio_buffers]
+
+                # Combine segments with silence by joining the raw sample
+                # data once; AudioSegment.__add__ would copy the accumulated
+                # bytestring on every append
+                silence = AudioSegment.silent(duration=int(pause * 1000), frame_rate=audio_segments[0].frame_rate).set_channels(audio_segments[0].channels)  # Pause in milliseconds
+                parts = [audio_segments[0]]
+                for segment in audio_segments[1:]:
+                    parts.extend((silence, segment))
+                combined_audio = audio_segments[0]._spawn(b''.join(part.raw_data for part in parts))
+
+                # Export combined audio
+                combined_audio.export(output_file, format=extension, bitrate=f"{bit_rate}k")
+        else:
+            cache_path = get_audio_cache_path(voice_id, model, output_format, text, extension) if use_cache else None
+            if cache_path is not None and cache_path.exists():
+                # Cache hit: no API call, no credits spent
+                link_or_copy(cache_path, output_file)
+            else:
+                # Single API call for no pause or single line
+                audio = client.generate(
+                    text=text,
+                    voice=voice_id,
+                    model=model,
+                    output_format=output_format,
+                    optimize_streaming_latency=latency
+                )
+                # copyfileobj pulls the small HTTP chunks into 1 MiB batches
+                # so each write hits the kernel as one large block
+                with open(output_file, "wb") as f:
+                    shutil.copyfileobj(_GenReader(audio), f, length=1024 * 1024)
+                if cache_path is not None:
+                    save_to_audio_cache(cache_path, output_file)
         
         print(f"Generated audio file: {output_file}")
     except Exception as e:
         print(f"Error generating audio: {str(e)}")
 
+async def process_segments_async(api_key, api_url, segments, voice_id, voice_name, model, audio_type, rate, prefix, concurrency, existing, use_cache=True, latency=0):
+    """Generate split-mode segments concurrently on one event loop using the async client."""
+    http_client = httpx.AsyncClient(http2=_HTTP2, limits=_HTTPX_LIMITS, timeout=httpx.Timeout(30.0))
+    # The async wrapper has no base_url shim, so build the environment the
+    # way the sync client does from the configured API URL
+    environment = ElevenLabsEnvironment(base=api_url, wss=api_url.replace("http", "ws", 1))
+    client = AsyncElevenLabs(api_key=api_key, environment=environment, httpx_client=http_client)
+    semaphore = asyncio.Semaphore(concurrency)
+    # Voice sanitization and format resolution are constant across the run
+    ctx = make_file_context(voice_name, audio_type, rate, prefix)
+    output_format = ctx.output_format
+
+    async def generate_segment(sample_number, sentence):
+        async with semaphore:
+            try:
+                output_file = unique_filename_from_context(ctx, start_sample_number=sample_number, existing=existing)
+                cache_path = get_audio_cache_path(voice_id, model, output_format, sentence, ctx.extension) if use_cache else None
+                if cache_path is not None and cache_path.exists():
+                    # Cache hit: no API call, no credits spent
+                    link_or_copy(cache_path, output_file)
+                else:
+                    audio = await client.generate(
+                        text=sentence,
+                        voice=voice_id,
+                        model=model,
+                        output_format=output_format,
+                        optimize_streaming_latency=latency
+                    )
+                    buf = bytearray()
+                    async for chunk in audio:
+                        buf.extend(chunk)
+                    Path(output_file).write_bytes(buf)
+                    if cache_path is not None:
+                        save_to_audio_cache(cache_path, output_file)
+                print(f"Generated audio file: {output_file}")
+                return output_file
+            except Exception as e:
+                print(f"Error generating audio: {str(e)}")
+                return None
+
+    # Identical lines produce bit-identical audio, so generate each unique
+    # text once and hardlink the repeats into their own sample numbers
+    first_seen = {}
+    duplicates = []
+    unique_segments = []
+    for sample_number, sentence in segments:
+        if sentence in first_seen:
+            duplicates.append((sample_number, sentence))
+        else:
+            first_seen[sentence] = None
+            unique_segments.append((sample_number, sentence))
+
+    try:
+        results = await asyncio.gather(*[generate_segment(sample_number, sentence) for sample_number, sentence in unique_segments])
+    finally:
+        # Tear down the pooled connections before asyncio.run closes the loop
+        await http_client.aclose()
+    for (_sample_number, sentence), output_file in zip(unique_segments, results):
+        first_seen[sentence] = output_file
+
+    for sample_number, sentence in duplicates:
+        source = first_seen[sentence]
+        if source is None:
+            continue  # generation failed; the error was already reported
+        output_file = unique_filename_from_context(ctx, start_sample_number=sample_number, existing=existing)
+        link_or_copy(source, output_file)
+        print(f"Generated audio file: {output_file}")
+
+def process_text_to_audio_stream(api_key, api_url, lines, voice_id, voice_name, model, audio_type, rate, prefix=None, start_sample_number=None, end_sample_number=None, pause=None, existing=None):
+    """Convert lines to a single audio file over the ElevenLabs stream-input WebSocket, inserting pauses as SSML breaks."""
+    try:
+        from websockets.sync.client import connect
+
+        output_format, khz_rate, bit_rate, extension = get_output_format(audio_type, rate)
+        output_file = get_unique_filename(voice_name, khz_rate, bit_rate, extension, prefix, start_sample_number, end_sample_number, existing)
+
+        # One WebSocket session replaces one HTTPS request per line
+        ws_base = api_url.replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+        uri = f"{ws_base}/v1/text-to-speech/{voice_id}/stream-input?model_id={model}&output_format={output_format}"
+        with connect(uri) as ws:
+            ws.send(json.dumps({"text": " ", "xi_api_key": api_key}))
+            for i, line in enumerate(lines):
+                if i > 0 and pause:
+                    ws.send(json.dumps({"text": f'<break time="{pause}s" /> '}))
+                ws.send(json.dumps({"text": line + " "}))
+            ws.send(json.dumps({"text": ""}))  # Empty text closes the stream
+            with open(output_file, "wb", buffering=1024 * 1024) as f:
+                while True:
+                    message = json.loads(ws.recv())
+                    if message.get("audio"):
+                        f.write(base64.b64decode(message["audio"]))
+                    if message.get("isFinal"):
+                        break
+
+        print(f"Generated audio file: {output_file}")
+    except Exception as e:
+        print(f"Error generating audio: {str(e)}")
+
 def get_file_prefix(filename):
     """Extract and slugify filename prefix, truncated to 10 characters."""
-    base = os.path.splitext(os.path.basename(filename))[0]
-    slug = slugify(base)
-    return slug[:10]
+    base = os.path.basename(filename)
+    base = base.rpartition('.')[0] or base
+    # Common fast path: names that are already slug-safe (and would come
+    # out of slugify unchanged) skip the translate/collapse passes
+    if (base.isascii() and all(c.isalnum() or c in '-.' for c in base)
+            and '--' not in base and not base.startswith('-') and not base.endswith('-')):
+        return base.lower()[:10]
+    return slugify(base)[:10]
+
+# Valid ElevenLabs output formats, keyed by audio type and rate:
+# (output_format, khz_rate, bit_rate, extension)
+_VALID_FORMATS = {
+    'mp3': {
+        32: ('mp3_22050_32', 22.05, 32, 'mp3'),
+        64: ('mp3_44100_64', 44.1, 64, 'mp3'),
+        96: ('mp3_44100_96', 44.1, 96, 'mp3'),
+        128: ('mp3_44100_128', 44.1, 128, 'mp3'),
+        192: ('mp3_44100_192', 44.1, 192, 'mp3')
+    },
+    'pcm': {
+        8000: ('pcm_8000', 8.0, 8000, 'wav'),
+        16000: ('pcm_16000', 16.0, 16000, 'wav'),
+        22050: ('pcm_22050', 22.05, 22050, 'wav'),
+        24000: ('pcm_24000', 24.0, 24000, 'wav'),
+        44100: ('pcm_44100', 44.1, 44100, 'wav')
+    },
+    'ulaw': {
+        8000: ('ulaw_8000', 8.0, 8000, 'ulaw')
+    },
+    'alaw': {
+        8000: ('alaw_8000', 8.0, 8000, 'alaw')
+    },
+    'opus': {
+        32: ('opus_48000_32', 48.0, 32, 'oga'),
+        64: ('opus_48000_64', 48.0, 64, 'oga'),
+        96: ('opus_48000_96', 48.0, 96, 'oga'),
+        128: ('opus_48000_128', 48.0, 128, 'oga'),
+        192: ('opus_48000_192', 48.0, 192, 'oga')
+    }
+}
 
+@functools.lru_cache(maxsize=32)
 def get_output_format(audio_type, rate):
     """Map audio type and rate to valid ElevenLabs output format and extract khz/bitrate."""
-    valid_formats = {
-        'mp3': {
-            32: ('mp3_22050_32', 22.05, 32, 'mp3'),
-            64: ('mp3_44100_64', 44.1, 64, 'mp3'),
-            96: ('mp3_44100_96', 44.1, 96, 'mp3'),
-            128: ('mp3_44100_128', 44.1, 128, 'mp3'),
-            192: ('mp3_44100_192', 44.1, 192, 'mp3')
-        },
-        'pcm': {
-            8000: ('pcm_8000', 8.0, 8000, 'wav'),
-            16000: ('pcm_16000', 16.0, 16000, 'wav'),
-            22050: ('pcm_22050', 22.05, 22050, 'wav'),
-            24000: ('pcm_24000', 24.0, 24000, 'wav'),
-            44100: ('pcm_44100', 44.1, 44100, 'wav')
-        },
-        'ulaw': {
-            8000: ('ulaw_8000', 8.0, 8000, 'ulaw')
-        },
-        'alaw': {
-            8000: ('alaw_8000', 8.0, 8000, 'alaw')
-        },
-        'opus': {
-            32: ('opus_48000_32', 48.0, 32, 'oga'),
-            64: ('opus_48000_64', 48.0, 64, 'oga'),
-            96: ('opus_48000_96', 48.0, 96, 'oga'),
-            128: ('opus_48000_128', 48.0, 128, 'oga'),
-            192: ('opus_48000_192', 48.0, 192, 'oga')
-        }
-    }
-    if audio_type not in valid_formats or rate not in valid_formats[audio_type]:
-        raise ValueError(f"Invalid {audio_type} rate {rate}. Valid options: {list(valid_formats[audio_type].keys())}")
-    return valid_formats[audio_type][rate]
+    if audio_type not in _VALID_FORMATS or rate not in _VALID_FORMATS[audio_type]:
+        raise ValueError(f"Invalid {audio_type} rate {rate}. Valid options: {list(_VALID_FORMATS[audio_type].keys())}")
+    return _VALID_FORMATS[audio_type][rate]
 
 def main():
     parser = argparse.ArgumentParser(description="Convert text to audio using ElevenLabs API")
@@ -244,9 +577,9 @@ def main():
     parser.add_argument("--last-line", type=int, help="Last line number to process (requires --file)")
     parser.add_argument("--estimate-credits", action="store_true", help="Estimate lines convertible with remaining credits (requires --file)")
     parser.add_argument("--voice", "-w", default="Adam", help="Voice name or ID (default: Adam)")
-    parser.add_argument("--model", "-m", default="eleven_multilingual_v2", 
-                       choices=["eleven_monolingual_v1", "eleven_multilingual_v1", "eleven_multilingual_v2", "eleven_turbo_v2"], 
-                       help="Model to use")
+    parser.add_argument("--model", "-m", default="eleven_flash_v2_5",
+                       choices=["eleven_monolingual_v1", "eleven_multilingual_v1", "eleven_multilingual_v2", "eleven_turbo_v2", "eleven_flash_v2", "eleven_flash_v2_5"],
+                       help="Model to use (flash/turbo models cost half the credits and have much lower latency)")
     parser.add_argument("--type", "-t", default="mp3", 
                        choices=["mp3", "pcm", "ulaw", "alaw", "opus"], 
                        help="Audio output type")
@@ -257,6 +590,12 @@ def main():
     parser.add_argument("--list", "-l", action="store_true", help="List available voices")
     parser.add_argument("--credits", "-c", action="store_true", help="Show remaining character credits")
     parser.add_argument("--pause", type=float, help="Pause duration in seconds between lines in non-split mode (requires --file, not --split, 0.0 to 30.0)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of concurrent API requests in split mode (default: 4)")
+    parser.add_argument("--stream", action="store_true", help="Use the WebSocket stream-input endpoint for --pause: one connection, pauses inserted server-side")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the local audio cache (~/.cache/elevenify/audio)")
+    parser.add_argument("--auto-model", action="store_true", help="Fall back to eleven_flash_v2_5 (half credit cost) when remaining credits are below twice the file estimate (requires --file)")
+    parser.add_argument("--refresh-voices", action="store_true", help="Ignore the cached voices list and fetch it fresh")
+    parser.add_argument("--latency", type=int, choices=[0, 1, 2, 3, 4], default=0, help="ElevenLabs streaming latency optimization level: 0 = none (default), 4 = fastest; higher levels trade some audio quality for lower time-to-first-byte")
     
     args = parser.parse_args()
 
@@ -281,10 +620,18 @@ def main():
             parser.error("--pause cannot be used with --split")
         if args.pause < 0.0 or args.pause > 30.0:
             parser.error("--pause must be between 0.0 and 30.0 seconds")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be a positive integer")
+    if args.stream and args.pause is None:
+        parser.error("--stream requires --pause")
+    if args.auto_model and not args.file:
+        parser.error("--auto-model requires --file")
 
-    # Load API key and URL, then initialize client
+    # Load API key and URL, then initialize client. A pooled HTTP/2
+    # transport lets every request in a run reuse one TLS session.
     api_key, api_url = load_api_key_and_url(args)
-    client = ElevenLabs(api_key=api_key, base_url=api_url)
+    http_client = httpx.Client(http2=_HTTP2, limits=_HTTPX_LIMITS, timeout=httpx.Timeout(30.0))
+    client = ElevenLabs(api_key=api_key, base_url=api_url, httpx_client=http_client)
 
     # Check credits if requested
     if args.credits:
@@ -293,103 +640,133 @@ def main():
 
     # List voices if requested
     if args.list:
-        list_voices(client)
+        list_voices(load_voices(client, api_key, args.refresh_voices))
         return
 
     # Validate input
     if not args.text and not args.file:
         parser.error("Either text or --file must be provided")
 
-    # Get voice ID and name
-    voices_by_name = {v.name: (v.voice_id, v.name) for v in client.voices.get_all().voices}
-    voices_by_id = {v.voice_id: (v.voice_id, v.name) for v in client.voices.get_all().voices}
-    
-    if args.voice in voices_by_name:
-        voice_id, voice_name = voices_by_name[args.voice]
-    elif args.voice in voices_by_id:
-        voice_id, voice_name = voices_by_id[args.voice]
+    # Get voice ID and name with a single scan of the voices list; no need
+    # to build name and ID lookup dicts for a one-shot lookup
+    for v in load_voices(client, api_key, args.refresh_voices):
+        if args.voice == v.name or args.voice == v.voice_id:
+            voice_id, voice_name = v.voice_id, v.name
+            break
     else:
-        raise ValueError(f"Voice '{args.voice}' not found. Use --list to see available voices.")
+        if _VOICE_ID_RE.fullmatch(args.voice):
+            # Looks like a raw ElevenLabs voice ID (e.g. a shared/library
+            # voice that is not in the account's list); pass it through
+            voice_id = voice_name = args.voice
+        else:
+            raise ValueError(f"Voice '{args.voice}' not found. Use --list to see available voices.")
 
     # Get prefix if using a file
     prefix = None
     if args.file:
         prefix = get_file_prefix(args.file)
 
+    # Everything but the text and sample numbers is constant for the run,
+    # so bind it once; call sites below pass only what varies. (Split mode
+    # hoists its per-run constants the same way via make_file_context.)
+    emit = functools.partial(
+        process_text_to_audio, client,
+        voice_id=voice_id, voice_name=voice_name, model=args.model,
+        audio_type=args.type, rate=args.rate, prefix=prefix,
+        use_cache=not args.no_cache, latency=args.latency,
+    )
+
     # Process input
     if args.file:
         with open(args.file, 'r', encoding='utf-8') as f:
-            text = f.read()
-        
-        # Validate start-line and last-line against file size
-        line_count = len(text.strip().split('\n'))
-        if args.start_line > line_count:
-            print(f"Error: --start-line {args.start_line} exceeds file line count ({line_count})")
-            return
-        if args.last_line is not None and args.last_line > line_count:
-            print(f"Error: --last-line {args.last_line} exceeds file line count ({line_count})")
-            return
-
-        # Set last_line to end of file if not specified
-        last_line = args.last_line if args.last_line is not None else line_count
-
-        if args.estimate_credits:
-            result = estimate_convertible_lines(client, text, args.start_line, last_line, args.model)
-            if result:
-                print(f"Remaining credits: {result['credits_remaining']:,}")
-                print(f"Model: {args.model} ({result['credit_cost']} credits per character)")
-                print(f"Lines that can be converted with current credits: {result['lines']}")
-                print(f"Characters for convertible lines: {result['characters']:,}")
-                print(f"Credits required for convertible lines: {result['credits_required']:,}")
-                estimate_label = "Full file estimate"
-                if args.start_line > 1 or args.last_line is not None:
-                    estimate_label += f" (from line {args.start_line}"
-                    if args.last_line is not None:
-                        estimate_label += f" to line {args.last_line}"
-                    estimate_label += ")"
-                print(f"{estimate_label}:")
-                print(f"  Total lines: {result['full_file_lines']}")
-                print(f"  Total characters: {result['full_file_characters']:,}")
-                print(f"  Total credits required: {result['full_file_credits']:,}")
-            return
-
-        if args.split:
-            segments = split_text(text, args.start_line, last_line)
-            for sample_number, sentence in segments:
-                process_text_to_audio(client, sentence, voice_id, voice_name, args.model, args.type, args.rate, prefix, start_sample_number=sample_number)
-        else:
-            # Filter out comment lines and lines outside start_line to last_line for non-split mode
-            lines = text.strip().split('\n')
-            non_comment_lines = []
-            sample_number = 0
-            first_sample_number = None
-            last_sample_number = None
-            line_number = 0
-            for line in lines:
-                line_number += 1
-                # Strip trailing comments
-                line = line.split('#', 1)[0].strip()
-                if not line:
-                    continue
-                sample_number += 1
-                if line_number < args.start_line or line_number > last_line:
-                    continue
-                if first_sample_number is None:
-                    first_sample_number = sample_number
-                last_sample_number = sample_number
-                non_comment_lines.append(line)
-            
-            if non_comment_lines:
-                # Use pydub for pause if specified, otherwise join with space
-                if args.pause is not None and len(non_comment_lines) > 1:
-                    process_text_to_audio(client, None, voice_id, voice_name, args.model, args.type, args.rate, prefix, first_sample_number, last_sample_number, pause=args.pause, lines=non_comment_lines)
+            # Processing below streams line-by-line from the handle; count
+            # lines only when there is a range bound to validate. Counting
+            # newlines in a read-only mapping avoids decoding every line.
+            if args.start_line > 1 or args.last_line is not None:
+                if os.path.getsize(args.file) == 0:
+                    # An empty file counts as one (blank) line, matching the
+                    # old strip().split('\n') behaviour; processing then falls
+                    # through to the "No non-comment lines" message.
+                    line_count = 1
                 else:
-                    combined_text = ' '.join(non_comment_lines)
-                    process_text_to_audio(client, combined_text, voice_id, voice_name, args.model, args.type, args.rate, prefix, first_sample_number, last_sample_number)
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        line_count = 0
+                        pos = mm.find(b'\n')
+                        while pos != -1:
+                            line_count += 1
+                            pos = mm.find(b'\n', pos + 1)
+                        if mm[-1:] != b'\n':
+                            line_count += 1  # Last line has no trailing newline
+                if args.start_line > line_count:
+                    print(f"Error: --start-line {args.start_line} exceeds file line count ({line_count})")
+                    return
+                if args.last_line is not None and args.last_line > line_count:
+                    print(f"Error: --last-line {args.last_line} exceeds file line count ({line_count})")
+                    return
+
+            # Unbounded sentinel: every line_number compares below infinity
+            last_line = args.last_line if args.last_line is not None else float('inf')
+
+            if args.estimate_credits:
+                result = estimate_convertible_lines(client, f, args.start_line, last_line, args.model)
+                if result:
+                    print(f"Remaining credits: {result['credits_remaining']:,}")
+                    print(f"Model: {args.model} ({result['credit_cost']} credits per character)")
+                    print(f"Lines that can be converted with current credits: {result['lines']}")
+                    print(f"Characters for convertible lines: {result['characters']:,}")
+                    print(f"Credits required for convertible lines: {result['credits_required']:,}")
+                    estimate_label = "Full file estimate"
+                    if args.start_line > 1 or args.last_line is not None:
+                        estimate_label += f" (from line {args.start_line}"
+                        if args.last_line is not None:
+                            estimate_label += f" to line {args.last_line}"
+                        estimate_label += ")"
+                    print(f"{estimate_label}:")
+                    print(f"  Total lines: {result['full_file_lines']}")
+                    print(f"  Total characters: {result['full_file_characters']:,}")
+                    print(f"  Total credits required: {result['full_file_credits']:,}")
+                return
+
+            if args.auto_model and "flash" not in args.model:
+                estimate = estimate_convertible_lines(client, f, args.start_line, last_line, args.model)
+                f.seek(0)
+                if estimate and estimate['credits_remaining'] < 2 * estimate['full_file_credits']:
+                    print(f"Auto-model: switching from {args.model} to eleven_flash_v2_5 to stay within remaining credits")
+                    args.model = "eleven_flash_v2_5"
+
+            if args.split:
+                segments = split_text(f, args.start_line, last_line)
+                # One event loop overlaps all segment requests on a single
+                # thread; the semaphore keeps in-flight requests bounded to
+                # respect rate limits, and one directory snapshot is shared
+                # by all segments for collision checks.
+                existing = {entry.name for entry in os.scandir('.')}
+                asyncio.run(process_segments_async(api_key, api_url, segments, voice_id, voice_name, args.model, args.type, args.rate, prefix, args.concurrency, existing, use_cache=not args.no_cache, latency=args.latency))
             else:
-                print("No non-comment lines to process in the specified line range.")
+                # Filter out comment lines and lines outside start_line to last_line for non-split mode
+                non_comment_lines = []
+                first_sample_number = None
+                last_sample_number = None
+                for _line_number, sample_number, line in iter_segments(f, args.start_line, last_line):
+                    if first_sample_number is None:
+                        first_sample_number = sample_number
+                    last_sample_number = sample_number
+                    non_comment_lines.append(line)
+
+                if non_comment_lines:
+                    # Use pydub for pause if specified, otherwise join with space
+                    if args.pause is not None and len(non_comment_lines) > 1:
+                        if args.stream:
+                            process_text_to_audio_stream(api_key, api_url, non_comment_lines, voice_id, voice_name, args.model, args.type, args.rate, prefix, first_sample_number, last_sample_number, pause=args.pause)
+                        else:
+                            emit(None, start_sample_number=first_sample_number, end_sample_number=last_sample_number, pause=args.pause, lines=non_comment_lines)
+                    else:
+                        combined_text = ' '.join(non_comment_lines)
+                        emit(combined_text, start_sample_number=first_sample_number, end_sample_number=last_sample_number)
+                else:
+                    print("No non-comment lines to process in the specified line range.")
     else:
-        process_text_to_audio(client, args.text, voice_id, voice_name, args.model, args.type, args.rate)
+        emit(args.text)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file